@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+'''
+Micro-benchmark of the resource_cleaner callback overhead.
+
+Pushes synthetic task results of every supported amazon.aws module through
+v2_runner_on_ok / v2_runner_item_on_ok, then v2_playbook_on_stats, and reports
+the time per event, the peak memory and the rollback emit time.
+
+usage: callback_overhead.py [--sizes 1000 10000 100000] [--save | --compare] [--baseline file]
+'''
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import yaml
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')
+)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from ansible.executor.stats import AggregateStats
+from plugins.callback.resource_cleaner import CallbackModule
+from benchmarks.synthetic_results import synthetic_results
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_THRESHOLD = 0.20    # a metric 20% above its baseline is a regression
+CHUNK_SIZE = 10000          # results are generated by chunks, outside of the timed section
+CHECKED_TASKS = 1000        # number of tasks of the rollback playbook checked after each run
+
+
+class BenchPlay:
+    name = 'benchmark'
+    hosts = ['localhost']
+    connection = 'local'
+    gather_facts = False
+
+
+def new_callback(output_path):
+    callback = CallbackModule()
+    callback._display.verbosity = 0
+    callback.playbook_output_path = output_path
+    callback.playbook_name = 'benchmark.yml'
+    callback.v2_playbook_on_play_start(BenchPlay())
+    return callback
+
+
+def feed(callback, size, args):
+    '''
+    Sends "size" results to the callback, returns the time spent in the callback
+    '''
+    elapsed = 0.0
+    for start in range(0, size, CHUNK_SIZE):
+        chunk = list(synthetic_results(min(CHUNK_SIZE, size - start), loop_ratio=args.loop_ratio,
+                                       large_instances=args.large_instances, large_every=args.large_every))
+        t0 = time.perf_counter()
+        for result in chunk:
+            if result._task.loop:
+                callback.v2_runner_item_on_ok(result)
+            else:
+                callback.v2_runner_on_ok(result)
+        elapsed += time.perf_counter() - t0
+        del chunk
+
+    return elapsed
+
+
+def check_rollback(path, undo_tasks):
+    '''
+    Makes sure the benchmark times the writing of a valid rollback playbook:
+    raises an AssertionError otherwise
+    '''
+    with open(path) as f:
+        playbook = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+    tasks = playbook[0]['tasks']
+    assert len(tasks) == undo_tasks, f"{len(tasks)} tasks in the rollback playbook, {undo_tasks} expected"
+    for task in tasks[::max(1, len(tasks) // CHECKED_TASKS)]:
+        assert task['name'].startswith('(UNDO) '), f"unexpected task name: {task['name']}"
+        modules = [key for key in task if key != 'name']
+        assert len(modules) == 1 and modules[0].startswith('amazon.aws.'), f"unexpected task: {task}"
+        for key, value in task[modules[0]].items():
+            if isinstance(value, str):
+                assert value and value[0] not in '\'"' and value[-1] not in '\'"', \
+                    f"{modules[0]}: quoted value {key}={value!r}"
+
+
+def run(size, args):
+    with tempfile.TemporaryDirectory() as output_path:
+        # Timing pass
+        gc.collect()
+        callback = new_callback(output_path)
+        events_time = feed(callback, size, args)
+        t0 = time.perf_counter()
+        callback.v2_playbook_on_stats(AggregateStats())
+        emit_time = time.perf_counter() - t0
+        rollback = os.path.join(output_path, callback.playbook_name + '.rollback')
+        rollback_size = os.path.getsize(rollback) if os.path.exists(rollback) else 0
+        undo_tasks = len(callback.actions)
+        del callback
+        check_rollback(rollback, undo_tasks)
+
+        # Memory pass (tracemalloc slows everything down: not timed)
+        peak_mb = None
+        if not args.no_memory:
+            gc.collect()
+            tracemalloc.start()
+            callback = new_callback(output_path)
+            feed(callback, size, args)
+            callback.v2_playbook_on_stats(AggregateStats())
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+            del callback
+
+    return {
+        'events': size,
+        'undo_tasks': undo_tasks,
+        'us_per_event': events_time / size * 1e6,
+        'emit_s': emit_time,
+        'rollback_kb': rollback_size / 1024,
+        'peak_mb': peak_mb,
+    }
+
+
+def compare(results, baseline, threshold):
+    '''
+    Returns the list of metrics that regressed compared to the baseline
+    '''
+    regressions = []
+    for size, current in results.items():
+        reference = baseline.get('results', {}).get(size)
+        if reference is None:
+            continue
+        for metric in ('us_per_event', 'emit_s', 'peak_mb'):
+            if current.get(metric) is None or not reference.get(metric):
+                continue
+            ratio = current[metric] / reference[metric]
+            if ratio > 1 + threshold:
+                regressions.append(f"{size} events: {metric} {current[metric]:.3f} vs {reference[metric]:.3f} (x{ratio:.2f})")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of the resource_cleaner callback')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='number of events per run (10^6 takes a while)')
+    parser.add_argument('--loop-ratio', type=float, default=0.25, help='share of the results coming from a loop')
+    parser.add_argument('--large-instances', type=int, default=20,
+                        help='number of instances described by a large ec2_instance result')
+    parser.add_argument('--large-every', type=int, default=100,
+                        help='one ec2_instance result out of N is a large one')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown compared to the baseline')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    group.add_argument('--compare', action='store_true', help='fail if the results regressed compared to the baseline')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'events':>10} {'undo tasks':>10} {'us/event':>10} {'emit (s)':>10} {'rollback (KB)':>14} {'peak (MB)':>10}")
+    for size in args.sizes:
+        result = run(size, args)
+        results[str(size)] = result
+        peak = f"{result['peak_mb']:10.1f}" if result['peak_mb'] is not None else f"{'-':>10}"
+        print(f"{result['events']:>10} {result['undo_tasks']:>10} {result['us_per_event']:>10.2f} "
+              f"{result['emit_s']:>10.3f} {result['rollback_kb']:>14.0f} {peak}")
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline to compare with: {args.baseline} does not exist (create it with --save)")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if regressions := compare(results, baseline, args.threshold):
+            print("Regressions:")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print("No regression")
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
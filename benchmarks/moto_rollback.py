@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+'''
+End-to-end rollback benchmark against a moto server (no AWS access).
+
+For each playbook, creates "count" resources (count variable of the
+playbook) once without and once with the callback, to measure the capture
+overhead, then plays the generated rollback playbook and checks that no
+resource is left behind. Reports the creation, capture and teardown times.
+The moto server is reset before each run.
+
+Requires: ansible-core, the amazon.aws collection, boto3 and moto[server].
+
+usage: moto_rollback.py [--count N] [--endpoint URL] [--env KEY=VALUE ...] [playbook ...]
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+import urllib.request
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')
+)
+
+# Copies of the playbooks of tests/ which do not depend on pre-existing resources, creating
+# "count" resources in a loop (ec2_placement_group is left out: moto does not implement it)
+PLAYBOOKS = [
+    'aws-pb-dhcp-option.yml',
+    'aws-pb-eip.yml',
+    'aws-pb-key.yml',
+    'aws-pb-launch-template.yml',
+    'aws-pb-s3-bucket.yml',
+    'aws-pb-secgrp.yml',
+    'aws-pb-vol.yml',
+    'aws-pb-vpc.yml',
+]
+
+REGION = 'eu-west-3'
+
+MOTO_PORT = 5000
+
+# moto accepts any credentials
+CREDENTIALS = {
+    'aws_access_key_id': 'testing',
+    'aws_secret_access_key': 'testing',
+}
+
+
+def start_moto(port):
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    return server, f'http://127.0.0.1:{port}'
+
+
+# Deletes all the resources of the moto server
+def reset_moto(endpoint):
+    request = urllib.request.Request(f'{endpoint}/moto-api/reset', method='POST')
+    urllib.request.urlopen(request).close()
+
+
+def aws_env(endpoint):
+    env = dict(os.environ)
+    env.update({
+        'AWS_ACCESS_KEY_ID': CREDENTIALS['aws_access_key_id'],
+        'AWS_SECRET_ACCESS_KEY': CREDENTIALS['aws_secret_access_key'],
+        'AWS_URL': endpoint,            # amazon.aws modules
+        'AWS_ENDPOINT_URL': endpoint,   # boto3 >= 1.28
+    })
+    env.pop('AWS_PROFILE', None)
+    return env
+
+
+def inventory(endpoint):
+    '''
+    Snapshot of the resources handled by the benchmarked playbooks
+    '''
+    import boto3
+
+    ec2 = boto3.client('ec2', region_name=REGION, endpoint_url=endpoint, **CREDENTIALS)
+    resources = set()
+    resources |= {('vpc', v['VpcId']) for v in ec2.describe_vpcs()['Vpcs'] if not v.get('IsDefault')}
+    resources |= {('subnet', s['SubnetId']) for s in ec2.describe_subnets()['Subnets'] if not s.get('DefaultForAz')}
+    resources |= {('security_group', g['GroupId']) for g in ec2.describe_security_groups()['SecurityGroups']
+                  if g['GroupName'] != 'default'}
+    resources |= {('dhcp_options', d['DhcpOptionsId']) for d in ec2.describe_dhcp_options()['DhcpOptions']}
+    resources |= {('eip', a['PublicIp']) for a in ec2.describe_addresses()['Addresses']}
+    resources |= {('key', k['KeyName']) for k in ec2.describe_key_pairs()['KeyPairs']}
+    resources |= {('launch_template', t['LaunchTemplateName'])
+                  for t in ec2.describe_launch_templates()['LaunchTemplates']}
+    resources |= {('volume', v['VolumeId']) for v in ec2.describe_volumes()['Volumes']
+                  if v['State'] not in ('deleting', 'deleted')}
+
+    s3 = boto3.client('s3', region_name=REGION, endpoint_url=endpoint, **CREDENTIALS)
+    resources |= {('bucket', b['Name']) for b in s3.list_buckets()['Buckets']}
+    return resources
+
+
+def ansible_playbook(playbook, env, extra_vars=None):
+    command = ['ansible-playbook', playbook]
+    if extra_vars:
+        command += ['-e', json.dumps(extra_vars)]
+    t0 = time.perf_counter()
+    process = subprocess.run(command, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if process.returncode:
+        print(process.stdout[-2000:], file=sys.stderr)
+        raise RuntimeError(f"{' '.join(command)} failed with return code {process.returncode}")
+    return elapsed
+
+
+def run(playbook, count, endpoint, workdir, callback_env):
+    name = os.path.basename(playbook)
+    env = aws_env(endpoint)
+    extra_vars = {
+        'region': REGION,
+        'count': count,
+        'bucket': f'rollback-bench-{int(time.time())}',
+    }
+
+    # Reference creation, without the callback
+    reset_moto(endpoint)
+    creation_time = ansible_playbook(playbook, env | {'ANSIBLE_CALLBACKS_ENABLED': ''}, extra_vars)
+
+    # Same creation, with the callback enabled
+    reset_moto(endpoint)
+    before = inventory(endpoint)
+    output_path = os.path.join(workdir, name)
+    run_env = env | callback_env | {
+        'ANSIBLE_CALLBACKS_ENABLED': 'resource_cleaner',
+        'ANSIBLE_CALLBACK_PLUGINS': os.path.join(BASE_DIR, 'plugins', 'callback'),
+        'RESOURCE_CLEANER_OUTPUT_PATH': output_path,
+    }
+    capture_time = ansible_playbook(playbook, run_env, extra_vars)
+    created = inventory(endpoint) - before
+
+    # Teardown, without the callback: a rollback must not create any resource
+    undo_tasks = 0
+    teardown_time = 0.0
+    rollback = os.path.join(output_path, name + '.rollback')
+    if os.path.exists(rollback):
+        with open(rollback) as f:
+            undo_tasks = f.read().count('(UNDO)')
+        teardown_time = ansible_playbook(rollback, env | {'ANSIBLE_CALLBACKS_ENABLED': ''})
+
+    left = inventory(endpoint) - before
+    return {
+        'playbook': name,
+        'count': count,
+        'created': len(created),
+        'undo_tasks': undo_tasks,
+        'creation_s': creation_time,
+        'with_callback_s': capture_time,
+        'capture_s': capture_time - creation_time,
+        'teardown_s': teardown_time,
+        'left_behind': sorted(f'{kind}:{ident}' for kind, ident in left),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end rollback benchmark against a moto server')
+    parser.add_argument('playbooks', nargs='*', help=f'playbooks to run (default: {len(PLAYBOOKS)} playbooks of tests/bench/)')
+    parser.add_argument('--count', type=int, default=1, help='number of resources created by each playbook')
+    parser.add_argument('--endpoint', help='URL of an already running moto server, which is reset (default: start one)')
+    parser.add_argument('--port', type=int, default=MOTO_PORT, help='port of the moto server started by the benchmark')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='callback option given as environment variable, to compare output modes')
+    parser.add_argument('--output', help='JSON file where the results are written')
+    args = parser.parse_args()
+
+    if args.count < 1:
+        sys.exit("--count must be at least 1")
+
+    playbooks = args.playbooks or [os.path.join(BASE_DIR, 'tests', 'bench', name) for name in PLAYBOOKS]
+    callback_env = dict(option.split('=', 1) for option in args.env)
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        server, endpoint = start_moto(args.port)
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(f"{'playbook':<32} {'count':>5} {'created':>8} {'undo':>6} {'creation (s)':>13} "
+                  f"{'capture (s)':>12} {'teardown (s)':>13} {'left':>5}")
+            for playbook in playbooks:
+                result = run(playbook, args.count, endpoint, workdir, callback_env)
+                results.append(result)
+                print(f"{result['playbook']:<32} {result['count']:>5} {result['created']:>8} {result['undo_tasks']:>6} "
+                      f"{result['creation_s']:>13.2f} {result['capture_s']:>12.2f} {result['teardown_s']:>13.2f} "
+                      f"{len(result['left_behind']):>5}")
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    leftovers = [item for result in results for item in result['left_behind']]
+    if leftovers:
+        print("Left behind:")
+        for item in leftovers:
+            print("  " + item)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,223 @@
+# Synthetic task results for the amazon.aws modules handled by AWSCleaner
+
+import itertools
+
+from ansible.inventory.host import Host
+from ansible.utils.unsafe_proxy import wrap_var
+
+REGION = 'eu-west-3'
+HOST = Host('localhost')
+
+
+class SyntheticTask:
+    def __init__(self, loop):
+        self.loop = loop
+
+
+class SyntheticResult:
+    '''
+    Stands for the Ansible TaskResult: exposes both the attributes used by
+    the callback (_result, _task_fields, ...) and the ones used by CallbackBase
+    (result/host since ansible-core 2.19, _result/_host before).
+    '''
+    def __init__(self, action, task_name, result, loop=False):
+        self._host = self.host = HOST
+        self._task = SyntheticTask(['item'] if loop else None)
+        self._task_fields = wrap_var({'name': task_name, 'action': action})
+        self._result = self.result = wrap_var(result)
+        self.task_name = task_name
+
+    def is_changed(self):
+        return self._result.get('changed', False)
+
+    def is_failed(self):
+        return False
+
+    def is_skipped(self):
+        return False
+
+    def is_unreachable(self):
+        return False
+
+
+def _invocation(**module_args):
+    module_args.setdefault('region', REGION)
+    return {'invocation': {'module_args': module_args}}
+
+
+def _instance(n):
+    # Mimics one element of the "instances" list returned by ec2_instance
+    instance_id = f'i-{n:017x}'
+    return {
+        'ami_launch_index': 0,
+        'architecture': 'x86_64',
+        'block_device_mappings': [{
+            'device_name': f'/dev/xvd{chr(97 + d)}',
+            'ebs': {
+                'attach_time': '2024-01-01T00:00:00+00:00',
+                'delete_on_termination': True,
+                'status': 'attached',
+                'volume_id': f'vol-{n:08x}{d:09x}',
+            },
+        } for d in range(4)],
+        'client_token': f'token-{n}',
+        'cpu_options': {'core_count': 2, 'threads_per_core': 2},
+        'ebs_optimized': True,
+        'ena_support': True,
+        'hibernation_options': {'configured': False},
+        'hypervisor': 'xen',
+        'image_id': 'ami-0123456789abcdef0',
+        'instance_id': instance_id,
+        'instance_type': 'm5.xlarge',
+        'key_name': 'bench-key',
+        'launch_time': '2024-01-01T00:00:00+00:00',
+        'metadata_options': {
+            'http_endpoint': 'enabled',
+            'http_put_response_hop_limit': 1,
+            'http_tokens': 'required',
+            'state': 'applied',
+        },
+        'monitoring': {'state': 'disabled'},
+        'network_interfaces': [{
+            'attachment': {
+                'attach_time': '2024-01-01T00:00:00+00:00',
+                'attachment_id': f'eni-attach-{n:08x}{e:09x}',
+                'delete_on_termination': True,
+                'device_index': e,
+                'status': 'attached',
+            },
+            'description': '',
+            'groups': [{'group_id': 'sg-0123456789abcdef0', 'group_name': 'bench'}],
+            'mac_address': f'06:00:00:{n % 256:02x}:{e:02x}:00',
+            'network_interface_id': f'eni-{n:08x}{e:09x}',
+            'owner_id': '123456789012',
+            'private_dns_name': f'ip-10-0-{n % 256}-{e}.{REGION}.compute.internal',
+            'private_ip_address': f'10.0.{n % 256}.{e}',
+            'private_ip_addresses': [{
+                'primary': True,
+                'private_dns_name': f'ip-10-0-{n % 256}-{e}.{REGION}.compute.internal',
+                'private_ip_address': f'10.0.{n % 256}.{e}',
+            }],
+            'source_dest_check': True,
+            'status': 'in-use',
+            'subnet_id': 'subnet-0123456789abcdef0',
+            'vpc_id': 'vpc-0123456789abcdef0',
+        } for e in range(2)],
+        'placement': {'availability_zone': f'{REGION}a', 'group_name': '', 'tenancy': 'default'},
+        'private_dns_name': f'ip-10-0-{n % 256}-0.{REGION}.compute.internal',
+        'private_ip_address': f'10.0.{n % 256}.0',
+        'root_device_name': '/dev/xvda',
+        'root_device_type': 'ebs',
+        'security_groups': [{'group_id': 'sg-0123456789abcdef0', 'group_name': 'bench'}],
+        'state': {'code': 16, 'name': 'running'},
+        'subnet_id': 'subnet-0123456789abcdef0',
+        'tags': {'Name': f'bench-{n}', 'Environment': 'benchmark', 'Owner': 'resource_cleaner'},
+        'virtualization_type': 'hvm',
+        'vpc_id': 'vpc-0123456789abcdef0',
+    }
+
+
+def ec2_instance(n, instances=1):
+    payload = [_instance(n * instances + i) for i in range(instances)]
+    return {
+        'changed': True,
+        'changed_ids': [i['instance_id'] for i in payload],
+        'instance_ids': [i['instance_id'] for i in payload],
+        'instances': payload,
+        **_invocation(state='running', image_id='ami-0123456789abcdef0', instance_type='m5.xlarge',
+                      count=instances, wait=True),
+    }
+
+
+# One factory per supported module: returns the "_result" of a changed task
+FACTORIES = {
+    'amazon.aws.ec2_ami': lambda n: {
+        'changed': True, 'image_id': f'ami-{n:017x}',
+        **_invocation(state='present', name=f'bench-{n}', instance_id=f'i-{n:017x}')},
+    'amazon.aws.ec2_eip': lambda n: {
+        'changed': True, 'allocation_id': f'eipalloc-{n:017x}', 'public_ip': f'198.51.{n // 256 % 256}.{n % 256}',
+        **_invocation(state='present', in_vpc=True)},
+    'amazon.aws.ec2_eni': lambda n: {
+        'changed': True, 'interface': {'id': f'eni-{n:017x}', 'subnet_id': 'subnet-0123456789abcdef0'},
+        **_invocation(state='present', subnet_id='subnet-0123456789abcdef0')},
+    'amazon.aws.ec2_instance': ec2_instance,
+    'amazon.aws.ec2_key': lambda n: {
+        'changed': True, 'key': {'id': f'key-{n:017x}', 'name': f'bench-{n}', 'fingerprint': 'ab:cd' * 8},
+        **_invocation(state='present', name=f'bench-{n}')},
+    'amazon.aws.ec2_launch_template': lambda n: {
+        'changed': True, 'template': {'launch_template_id': f'lt-{n:017x}', 'launch_template_name': f'bench-{n}'},
+        **_invocation(state='present', template_name=f'bench-{n}')},
+    'amazon.aws.ec2_placement_group': lambda n: {
+        'changed': True, 'placement_group': {'name': f'bench-{n}', 'state': 'available', 'strategy': 'cluster'},
+        **_invocation(state='present', name=f'bench-{n}')},
+    'amazon.aws.ec2_security_group': lambda n: {
+        'changed': True, 'group_id': f'sg-{n:017x}', 'group_name': f'bench-{n}', 'vpc_id': 'vpc-0123456789abcdef0',
+        **_invocation(state='present', name=f'bench-{n}', description='benchmark')},
+    'amazon.aws.ec2_snapshot': lambda n: {
+        'changed': True, 'snapshot_id': f'snap-{n:017x}', 'volume_id': f'vol-{n:017x}',
+        **_invocation(state='present', volume_id=f'vol-{n:017x}')},
+    'amazon.aws.ec2_spot_instance': lambda n: {
+        'changed': True, 'spot_request': {'spot_instance_request_id': f'sir-{n:08x}'},
+        **_invocation(state='present')},
+    'amazon.aws.ec2_tag': lambda n: {
+        'changed': True, 'tags': {'Name': f'bench-{n}'},
+        **_invocation(state='present', resource=f'i-{n:017x}', tags={'Name': f'bench-{n}', 'Env': 'bench'})},
+    'amazon.aws.ec2_vol': lambda n: {
+        'changed': True, 'volume': {'id': f'vol-{n:017x}', 'size': 8, 'volume_type': 'gp3'},
+        **_invocation(state='present', volume_size=8)},
+    'amazon.aws.ec2_vpc_dhcp_option': lambda n: {
+        'changed': True, 'dhcp_options_id': f'dopt-{n:017x}',
+        **_invocation(state='present', domain_name='bench.internal')},
+    'amazon.aws.ec2_vpc_endpoint': lambda n: {
+        'changed': True, 'result': {'vpc_endpoint_id': f'vpce-{n:017x}'},
+        **_invocation(state='present', vpc_id='vpc-0123456789abcdef0', service=f'com.amazonaws.{REGION}.s3')},
+    'amazon.aws.ec2_vpc_igw': lambda n: {
+        'changed': True, 'gateway_id': f'igw-{n:017x}', 'vpc_id': f'vpc-{n:017x}',
+        **_invocation(state='present', vpc_id=f'vpc-{n:017x}')},
+    'amazon.aws.ec2_vpc_nacl': lambda n: {
+        'changed': True, 'nacl_id': f'acl-{n:017x}',
+        **_invocation(state='present', vpc_id='vpc-0123456789abcdef0', name=f'bench-{n}')},
+    'amazon.aws.ec2_vpc_nat_gateway': lambda n: {
+        'changed': True, 'nat_gateway_id': f'nat-{n:017x}',
+        'nat_gateway_addresses': [{'allocation_id': f'eipalloc-{n:017x}', 'public_ip': f'198.51.100.{n % 256}'}],
+        **_invocation(state='present', subnet_id='subnet-0123456789abcdef0', allocation_id=f'eipalloc-{n:017x}')},
+    'amazon.aws.ec2_vpc_net': lambda n: {
+        'changed': True, 'vpc': {'id': f'vpc-{n:017x}', 'cidr_block': '10.0.0.0/16'},
+        **_invocation(state='present', name=f'bench-{n}', cidr_block='10.0.0.0/16')},
+    'amazon.aws.ec2_vpc_route_table': lambda n: {
+        'changed': True, 'route_table': {'route_table_id': f'rtb-{n:017x}', 'vpc_id': 'vpc-0123456789abcdef0'},
+        **_invocation(state='present', vpc_id='vpc-0123456789abcdef0')},
+    'amazon.aws.ec2_vpc_subnet': lambda n: {
+        'changed': True,
+        'subnet': {'id': f'subnet-{n:017x}', 'vpc_id': 'vpc-0123456789abcdef0',
+                   'cidr_block': f'10.{n // 256 % 256}.{n % 256}.0/24'},
+        **_invocation(state='present', vpc_id='vpc-0123456789abcdef0', cidr=f'10.{n // 256 % 256}.{n % 256}.0/24')},
+    'amazon.aws.s3_bucket': lambda n: {
+        'changed': True, 'name': f'bench-bucket-{n}',
+        **_invocation(state='present', name=f'bench-bucket-{n}')},
+    'amazon.aws.s3_object': lambda n: {
+        'changed': True, 'msg': 'PUT operation complete',
+        **_invocation(mode='put', bucket='bench-bucket', object=f'dir/key-{n}.txt', src='/tmp/file.txt')},
+}
+
+
+def synthetic_results(count, modules=None, loop_ratio=0.25, large_instances=20, large_every=100):
+    '''
+    Generator of "count" synthetic results, cycling over the given modules.
+    Every "large_every" ec2_instance result describes "large_instances" instances.
+    A "loop_ratio" share of the results comes from a loop (v2_runner_item_on_ok).
+    '''
+    modules = modules or sorted(FACTORIES)
+    loop_every = int(1 / loop_ratio) if loop_ratio else 0
+    ec2_count = 0
+    for n, module in zip(range(count), itertools.cycle(modules)):
+        if module == 'amazon.aws.ec2_instance':
+            ec2_count += 1
+            instances = large_instances if large_every and ec2_count % large_every == 0 else 1
+            payload = ec2_instance(n, instances)
+        else:
+            payload = FACTORIES[module](n)
+        loop = bool(loop_every) and n % loop_every == 0
+        yield SyntheticResult(module, f'bench task {n}', payload, loop=loop)
+
+# EOF
@@ -33,6 +33,73 @@ DOCUMENTATION = '''
         ini:
           - section: resource_cleaner
             key: hide_sensitive_data
+      event_socket_path:
+        required: False
+        default: ''
+        description:
+          - Unix domain socket or named pipe where each undo record is sent as a length-prefixed JSON message
+          - sending is buffered and never holds the playbook up; empty disables the stream
+        env:
+          - name: RESOURCE_CLEANER_EVENT_SOCKET
+        ini:
+          - section: resource_cleaner
+            key: event_socket_path
+      event_queue_size:
+        required: False
+        default: 1000
+        type: int
+        description: number of undo records buffered while the consumer is slow or absent
+        env:
+          - name: RESOURCE_CLEANER_EVENT_QUEUE_SIZE
+        ini:
+          - section: resource_cleaner
+            key: event_queue_size
+      event_spill_path:
+        required: False
+        default: ''
+        description: file where undo records are appended when the buffer is full; empty means they are dropped
+        env:
+          - name: RESOURCE_CLEANER_EVENT_SPILL_PATH
+        ini:
+          - section: resource_cleaner
+            key: event_spill_path
+      record_path:
+        required: False
+        default: ''
+        description:
+          - gzip-compressed JSONL file where the changed task results are recorded (rewritten by each run)
+          - the rollback playbook can be regenerated offline from it with tools/rollback_replay.py
+          - the recorded results contain the module arguments, including credentials
+        env:
+          - name: RESOURCE_CLEANER_RECORD_PATH
+        ini:
+          - section: resource_cleaner
+            key: record_path
+      discover_blockers:
+        required: False
+        default: False
+        type: bool
+        description:
+          - if True, looks for the ENIs, NAT gateways and load balancers that would prevent the deletion of the VPCs, subnets and security groups (requires boto3)
+          - their deletion, or a wait for their release, is added to the rollback playbook ahead of their parents
+        env:
+          - name: RESOURCE_CLEANER_DISCOVER_BLOCKERS
+        ini:
+          - section: resource_cleaner
+            key: discover_blockers
+      s3_bulk_delete_threshold:
+        required: False
+        default: 0
+        type: int
+        description:
+          - when the rollback deletes at least this number of objects from the same bucket, they are deleted by a
+            single majeinfo.resource_cleaner.s3_bulk_delete task (1000 keys per call) instead of one task per key
+          - the keys are written in a manifest file next to the rollback playbook; 0 disables this feature
+        env:
+          - name: RESOURCE_CLEANER_S3_BULK_DELETE_THRESHOLD
+        ini:
+          - section: resource_cleaner
+            key: s3_bulk_delete_threshold
 '''
 
 import sys
@@ -54,12 +121,19 @@ if BASE_DIR not in sys.path:
 
 # Here, add other Cleaner (in the future)
 from plugins.module_utils.aws_cleaner import AWSCleaner
+from plugins.module_utils.aws_blockers import AWSBlockerDiscovery
+from plugins.module_utils.aws_s3_bulk import AWSS3BulkDelete
 from plugins.module_utils.gcp_cleaner import GCPCleaner
+from plugins.module_utils.event_sink import EventSink
+from plugins.module_utils.task_recorder import TaskRecorder
 
 
 # Parameters and their default values
 PLAYBOOK_OUTPUT_PATH = '.'
 HIDE_SENSITIVE_DATA = False
+DISCOVER_BLOCKERS = False
+S3_BULK_DELETE_THRESHOLD = 0
+EVENT_QUEUE_SIZE = 1000
 
 
 class CallbackModule(CallbackBase):
@@ -80,6 +154,10 @@ class CallbackModule(CallbackBase):
         self.play = None                # current play
         self.actions = []               # recorded actions for a Play
         self.hide_sensitive_data = HIDE_SENSITIVE_DATA
+        self.event_sink = None          # optional stream of the undo records
+        self.recorder = None            # optional record of the task results
+        self.discover_blockers = DISCOVER_BLOCKERS
+        self.s3_bulk_delete_threshold = S3_BULK_DELETE_THRESHOLD
 
         # List of handled Cloud providers
         self.providers = {
@@ -96,6 +174,8 @@ class CallbackModule(CallbackBase):
         self._debug("set_options called")
         self.playbook_output_path = self.get_option('playbook_output_path')
         self.hide_sensitive_date = self.get_option('hide_sensitive_data')
+        self.discover_blockers = self.get_option('discover_blockers')
+        self.s3_bulk_delete_threshold = self.get_option('s3_bulk_delete_threshold')
 
         # Create the output_path if necessary
         if not os.path.exists(self.playbook_output_path):
@@ -109,12 +189,31 @@ class CallbackModule(CallbackBase):
             self._display.warning(f'The path given by playbook_output_path parameter is not a directory: {self.playbook_output_path}.')
             self.disabled = True
 
+        # Stream the undo records to an external consumer
+        if event_socket_path := self.get_option('event_socket_path'):
+            self.event_sink = EventSink(self, event_socket_path,
+                                        queue_size=self.get_option('event_queue_size') or EVENT_QUEUE_SIZE,
+                                        spill_path=self.get_option('event_spill_path') or None)
+
+        # Record the task results to replay them offline
+        if record_path := self.get_option('record_path'):
+            try:
+                self.recorder = TaskRecorder(self, record_path)
+            except Exception as e:
+                self._display.warning(f'Cannot open the file given by record_path parameter: {record_path}.')
+                self._display.warning(e)
+
     # Now the playbook starts !
     def v2_playbook_on_start(self, playbook):
         self._debug("v2_playbook_on_start")
         super().v2_playbook_on_start(playbook)
         self.playbook_fullname = playbook._file_name
         self.playbook_name = os.path.basename(playbook._file_name)
+        if self.recorder is not None:
+            self.recorder.record_playbook(self.playbook_name, {
+                'discover_blockers': self.discover_blockers,
+                's3_bulk_delete_threshold': self.s3_bulk_delete_threshold,
+            })
 
     # Each Play of the Playbook starts now
     def v2_playbook_on_play_start(self, play):
@@ -123,6 +222,8 @@ class CallbackModule(CallbackBase):
         self._debug(play)
         self.play = play
         self.actions = []
+        if self.recorder is not None:
+            self.recorder.record_play(play)
 
     # A task is started now
     def v2_playbook_on_task_start(self, task, is_conditional, handler=False):
@@ -166,6 +267,9 @@ class CallbackModule(CallbackBase):
         if not result._result.get('changed', False):
             return
 
+        if self.recorder is not None:
+            self.recorder.record_result(result)
+
         # AnsibleUnicode to str otherwise the YAML dump will fail...
         action_name = str(result._task_fields.get('action'))
         for key, cleaner in self.providers.items():
@@ -195,8 +299,22 @@ class CallbackModule(CallbackBase):
         if type(action) == list:
             for act in action:
                 self.actions.insert(0, final_action_name | act)
+                self._send_event(self.actions[0], module_name)
         else:
             self.actions.insert(0, final_action_name | action)
+            self._send_event(self.actions[0], module_name)
+
+    # Send an undo record to the external consumer (if any)
+    def _send_event(self, action, module_name):
+        if self.event_sink is None:
+            return
+
+        self.event_sink.send({
+            'playbook': self.playbook_name,
+            'play': str(self.play.name) if self.play else None,
+            'module': module_name,
+            'action': action,
+        })
 
     # The runner failed
     def v2_runner_on_failed(self, result, ignore_errors=False):
@@ -226,10 +344,24 @@ class CallbackModule(CallbackBase):
         '''
         self._debug("v2_playbook_on_stats")
         super().v2_playbook_on_stats(stats)
+        if self.event_sink is not None:
+            self.event_sink.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
         if self.disabled:
             return
 
         hosts = sorted(stats.processed.keys())
+        self.generate_rollback()
+
+    # Post-process the actions of the Play, then generate the rollback playbook
+    # (also used by tools/rollback_replay.py)
+    def generate_rollback(self):
+        if self.discover_blockers and self.actions:
+            self.actions = AWSBlockerDiscovery(self).insert_blockers(self.actions)
+        if self.s3_bulk_delete_threshold and self.actions:
+            self.actions = AWSS3BulkDelete(self, self.s3_bulk_delete_threshold).coalesce(self.actions)
         self.rollback_playbook()
 
     # Generate the rollback playbook
@@ -252,8 +384,11 @@ class CallbackModule(CallbackBase):
             yaml.dump(playbook, f, Dumper=IndentDumper, sort_keys=False)
 
     # Convert AnsibleUnsafeText into a real str (needed for the YAML dumper)
+    # str.__str__ also works with a plain str (ansible-core >= 2.19 no longer wraps values)
     def _to_text(self, value):
-        return super(type(value), value).__str__()
+        if isinstance(value, str):
+            return str.__str__(value)
+        return str(value)
 
     # Display message if display mode and verbosity is sufficient
     def _info(self, msg):
@@ -0,0 +1,275 @@
+# Discovery of the resources that prevent a VPC, a subnet or a security group from being deleted
+
+from .aws_cleaner import AWS_CONNECTION_KEYS
+
+try:
+    import boto3
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+
+
+# Maximum number of values in a describe filter
+FILTER_CHUNK_SIZE = 200
+
+# Modules deleting the ELBv2 load balancers, by type
+ELBV2_MODULES = {
+    'application': 'amazon.aws.elb_application_lb',
+    'network': 'community.aws.elb_network_lb',
+}
+
+# ENI filter matching the resources attached to a parent
+PARENT_FILTERS = {
+    'vpc': 'vpc-id',
+    'subnet': 'subnet-id',
+    'group': 'group-id',
+}
+
+# Waiting for ENIs released by AWS (Lambda ENIs may take a while)
+WAIT_RETRIES = 90
+WAIT_DELAY = 20
+
+
+class AWSBlockerDiscovery:
+    '''
+    Looks for the ENIs, NAT gateways and load balancers attached to the VPCs,
+    subnets and security groups deleted by the rollback playbook (one batch of
+    describe calls per account/region), and inserts their deletion ahead of
+    the first task that deletes a parent. Otherwise the parent deletion fails
+    with a DependencyViolation. Only the blockers in a VPC or a subnet deleted
+    by the rollback are deleted.
+    Each parent deletion is also preceded by a wait until no ENI is attached
+    to it anymore: it is evaluated when the rollback is played, so it covers
+    the ENIs managed by AWS (Lambda, load balancers, ...) which are created,
+    replaced or released after the discovery.
+    '''
+    def __init__(self, callback):
+        self.callback = callback
+        self.deleted_ids = set()        # resources already deleted by the rollback playbook
+
+    def insert_blockers(self, actions):
+        if not HAS_BOTO3:
+            self.callback._info("boto3 is required to discover the blocking resources")
+            return actions
+
+        for action in actions:
+            for args in action.values():
+                if isinstance(args, dict):
+                    self.deleted_ids |= {str(args[key]) for key in ('nat_gateway_id', 'eni_id') if args.get(key)}
+
+        # Parents grouped by connection: {connection: {index in actions: (kind, parent)}}
+        groups = {}
+        for index, action in enumerate(actions):
+            if (parent := self._parent(action)) is not None:
+                args = parent[2]
+                connection = tuple((key, args.get(key)) for key in AWS_CONNECTION_KEYS)
+                groups.setdefault(connection, {})[index] = parent[:2]
+
+        # Blocker tasks to insert before a given action index
+        inserts = {}
+        for connection, parents in groups.items():
+            try:
+                blockers = self._discover(dict(connection), parents)
+            except Exception as e:
+                self.callback._info(f"Cannot discover the blocking resources: {e}")
+                continue
+            for index, tasks in blockers.items():
+                inserts.setdefault(index, []).extend(tasks)
+
+        result = []
+        for index, action in enumerate(actions):
+            result.extend(inserts.get(index, []))
+            result.append(action)
+
+        return result
+
+    # Returns (kind, parent id or (vpc_id, cidr), module args) if the action deletes a parent
+    def _parent(self, action):
+        if args := action.get('amazon.aws.ec2_vpc_net'):
+            return 'vpc', args.get('vpc_id'), args
+        if args := action.get('amazon.aws.ec2_vpc_subnet'):
+            return 'subnet', (args.get('vpc_id'), args.get('cidr')), args
+        if args := action.get('amazon.aws.ec2_security_group'):
+            return 'group', args.get('group_id'), args
+        return None
+
+    def _discover(self, connection, parents):
+        session = boto3.session.Session(
+            aws_access_key_id=connection.get('access_key'),
+            aws_secret_access_key=connection.get('secret_key'),
+            profile_name=connection.get('profile'),
+            region_name=connection.get('region'),
+        )
+        ec2 = session.client('ec2')
+
+        # Subnets are deleted by VPC and CIDR: get their ids
+        subnet_keys = {parent for kind, parent in parents.values() if kind == 'subnet'}
+        subnet_ids = {}
+        for subnet in self._describe(ec2, 'describe_subnets', 'Subnets', 'vpc-id',
+                                     {vpc_id for vpc_id, cidr in subnet_keys}):
+            if (key := (subnet['VpcId'], subnet['CidrBlock'])) in subnet_keys:
+                subnet_ids[key] = subnet['SubnetId']
+
+        # Parent id -> index of the first action which deletes it, and its kind
+        first_index = {}
+        kinds = {}
+        for index, (kind, parent) in sorted(parents.items()):
+            if kind == 'subnet':
+                if (parent := subnet_ids.get(parent)) is None:
+                    continue
+            first_index.setdefault(parent, index)
+            kinds[parent] = kind
+
+        vpc_ids = {parent for kind, parent in parents.values() if kind == 'vpc'}
+        group_ids = {parent for kind, parent in parents.values() if kind == 'group'}
+        subnet_ids = set(subnet_ids.values())
+
+        enis = {}
+        for name, values in (('vpc-id', vpc_ids), ('subnet-id', subnet_ids), ('group-id', group_ids)):
+            for eni in self._describe(ec2, 'describe_network_interfaces', 'NetworkInterfaces', name, values):
+                enis[eni['NetworkInterfaceId']] = eni
+
+        eni_vpc_ids = {eni.get('VpcId') for eni in enis.values()}
+        nat_gateways = [
+            nat for nat in self._describe(ec2, 'describe_nat_gateways', 'NatGateways', 'vpc-id',
+                                          vpc_ids | eni_vpc_ids,
+                                          filter_param='Filter')
+            if nat['State'] in ('pending', 'available')
+        ]
+
+        load_balancers = []
+        if any(self._is_elb(eni) for eni in enis.values()):
+            load_balancers = self._load_balancers(session, vpc_ids | eni_vpc_ids)
+
+        # Index before which a blocker must be handled. Blockers are only deleted when they are in a
+        # VPC or a subnet deleted by the rollback: a resource which only uses a deleted security group
+        # may not have been created by the playbook, the wait for the release of the ENIs reports it
+        def index_of(name, vpc_id, subnet_ids, group_ids=()):
+            blocked = [parent for parent in (vpc_id, *subnet_ids, *group_ids) if parent in first_index]
+            if not blocked:
+                return None
+            if all(kinds[parent] == 'group' for parent in blocked):
+                self.callback._info(f"{name} blocks the deletion of {', '.join(blocked)} but is not deleted: "
+                                    f"it may not have been created by the playbook")
+                return None
+            return min(first_index[parent] for parent in blocked)
+
+        blockers = {}
+        args = {key: value for key, value in connection.items() if value}
+
+        handled_enis = set()
+        for nat in nat_gateways:
+            nat_enis = {address.get('NetworkInterfaceId') for address in nat.get('NatGatewayAddresses', [])}
+            if (index := index_of(f"NAT gateway {nat['NatGatewayId']}", nat['VpcId'], [nat['SubnetId']])) is None:
+                continue
+            handled_enis |= nat_enis
+            if nat['NatGatewayId'] in self.deleted_ids:
+                continue
+            self._debug(f"NAT gateway {nat['NatGatewayId']} blocks the deletion of {nat['VpcId']}")
+            blockers.setdefault(index, []).append({
+                'name': f"(UNDO) delete blocking NAT gateway {nat['NatGatewayId']}",
+                'amazon.aws.ec2_vpc_nat_gateway': {
+                    'state': 'absent',
+                    'nat_gateway_id': nat['NatGatewayId'],
+                    'wait': True,
+                } | args,
+            })
+
+        for module, lb in load_balancers:
+            index = index_of(f"Load balancer {lb['Name']}", lb['VpcId'], lb['Subnets'], lb['SecurityGroups'])
+            if index is None:
+                continue
+            if module is None:
+                self.callback._info(f"Load balancer {lb['Name']} blocks the deletion of {lb['VpcId']} "
+                                    f"but cannot be deleted by the rollback playbook")
+                continue
+            self._debug(f"Load balancer {lb['Name']} blocks the deletion of {lb['VpcId']}")
+            blockers.setdefault(index, []).append({
+                'name': f"(UNDO) delete blocking load balancer {lb['Name']}",
+                module: {
+                    'state': 'absent',
+                    'name': lb['Name'],
+                } | args,
+            })
+
+        # The other ENIs are deleted when they are free (the others are waited for, see below)
+        for eni_id, eni in sorted(enis.items()):
+            if eni_id in handled_enis or eni_id in self.deleted_ids:
+                continue
+            groups = [group['GroupId'] for group in eni.get('Groups', [])]
+            if (index := index_of(f"ENI {eni_id}", eni.get('VpcId'), [eni.get('SubnetId')], groups)) is None:
+                continue
+            self._debug(f"ENI {eni_id} ({eni.get('Description')}) blocks the deletion of {eni.get('VpcId')}")
+            if eni.get('Status') == 'available' and not eni.get('RequesterManaged'):
+                blockers.setdefault(index, []).append({
+                    'name': f"(UNDO) delete blocking ENI {eni_id}",
+                    'amazon.aws.ec2_eni': {
+                        'state': 'absent',
+                        'eni_id': eni_id,
+                    } | args,
+                })
+
+        # Wait until the parent is free, whatever ENIs are attached when the rollback is played
+        for parent, index in first_index.items():
+            filter_name = PARENT_FILTERS[kinds[parent]]
+            blockers.setdefault(index, []).append({
+                'name': f"(UNDO) wait for the release of the ENIs attached to {parent}",
+                'amazon.aws.ec2_eni_info': {
+                    'filters': {filter_name: parent},
+                } | args,
+                'register': 'blocking_enis',
+                'until': 'blocking_enis.network_interfaces | length == 0',
+                'retries': WAIT_RETRIES,
+                'delay': WAIT_DELAY,
+            })
+
+        return blockers
+
+    # Paginated describe call, with the filter values given by chunks
+    def _describe(self, client, method, key, filter_name, values, filter_param='Filters'):
+        values = sorted(value for value in values if value)
+        paginator = client.get_paginator(method)
+        for start in range(0, len(values), FILTER_CHUNK_SIZE):
+            chunk = values[start:start + FILTER_CHUNK_SIZE]
+            for page in paginator.paginate(**{filter_param: [{'Name': filter_name, 'Values': chunk}]}):
+                yield from page[key]
+
+    # Application, network and classic load balancers of the given VPCs
+    def _load_balancers(self, session, vpc_ids):
+        load_balancers = []
+        elbv2 = session.client('elbv2')
+        for page in elbv2.get_paginator('describe_load_balancers').paginate():
+            for lb in page['LoadBalancers']:
+                if lb.get('VpcId') not in vpc_ids:
+                    continue
+                # Gateway load balancers: no module to delete them, only their ENIs are waited for
+                module = ELBV2_MODULES.get(lb['Type'])
+                load_balancers.append((module, {
+                    'Name': lb['LoadBalancerName'],
+                    'VpcId': lb['VpcId'],
+                    'Subnets': [zone['SubnetId'] for zone in lb.get('AvailabilityZones', [])],
+                    'SecurityGroups': lb.get('SecurityGroups', []),
+                }))
+
+        elb = session.client('elb')
+        for page in elb.get_paginator('describe_load_balancers').paginate():
+            for lb in page['LoadBalancerDescriptions']:
+                if lb.get('VPCId') not in vpc_ids:
+                    continue
+                load_balancers.append(('amazon.aws.elb_classic_lb', {
+                    'Name': lb['LoadBalancerName'],
+                    'VpcId': lb['VPCId'],
+                    'Subnets': lb.get('Subnets', []),
+                    'SecurityGroups': lb.get('SecurityGroups', []),
+                }))
+
+        return load_balancers
+
+    def _is_elb(self, eni):
+        return eni.get('InterfaceType') == 'network_load_balancer' or \
+            (eni.get('Description') or '').startswith('ELB ')
+
+    def _debug(self, msg):
+        self.callback._debug(msg)
+
+# EOF
@@ -3,6 +3,9 @@
 import sys
 from .cleaner_base import CleanerBase, not_supported
 
+# Module parameters copied from the task to its rollback to reach the same account/region
+AWS_CONNECTION_KEYS = ('access_key', 'secret_key', 'region', 'aws_config', 'profile')
+
 
 def aws_check_state_present(func):
     '''
@@ -53,9 +56,9 @@ class AWSCleaner(CleanerBase):
         public_ip = result._result.get('public_ip')
         self.callback._debug(f"EIP allocation_id {allocation_id}")
 
-        return self._ec2_eip_internal(public_ip, in_vpc)
+        return self._ec2_eip_internal(module_name, public_ip, in_vpc)
 
-    def _ec2_eip_internal(self, public_ip, in_vpc):
+    def _ec2_eip_internal(self, module_name, public_ip, in_vpc):
         # Generate amazon.aws.ec2_eip delete !
         return ({
             module_name: {
@@ -316,7 +319,7 @@ class AWSCleaner(CleanerBase):
                     continue
 
                 public_ip = eip['public_ip']
-                action = self._ec2_eip_internal(public_ip, in_vpc=True)
+                action = self._ec2_eip_internal('amazon.aws.ec2_eip', public_ip, in_vpc=True)
                 actions.append(action)
 
         # Generate amazon.aws.ec2_vpc_nat_gateway delete !
@@ -583,7 +586,7 @@ class AWSCleaner(CleanerBase):
 
         module_args = result._result.get('invocation').get('module_args')
         # TODO: handle secret ! do not write sensitive data
-        for key in ('access_key', 'secret_key', 'region', 'aws_config', 'profile'):
+        for key in AWS_CONNECTION_KEYS:
             if value := module_args.get(key):
                 final_action[module_name][key] = self._to_text(value)
 
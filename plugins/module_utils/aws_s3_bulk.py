@@ -0,0 +1,65 @@
+# Coalescing of the S3 object deletions of a rollback playbook
+
+import os
+import json
+
+from .aws_cleaner import AWS_CONNECTION_KEYS
+from .s3_delete import normalize_key
+
+BULK_DELETE_MODULE = 'majeinfo.resource_cleaner.s3_bulk_delete'
+
+
+class AWSS3BulkDelete:
+    '''
+    Replaces the "mode: delobj" tasks of amazon.aws.s3_object by a single
+    s3_bulk_delete task per bucket and account/region, when there are at least
+    "threshold" keys to delete. The keys are written in a manifest file next
+    to the rollback playbook, and deleted by chunks of 1000 keys.
+    '''
+    def __init__(self, callback, threshold):
+        self.callback = callback
+        self.threshold = threshold
+
+    def coalesce(self, actions):
+        # Key deletions grouped by bucket and connection: {group: [indexes in actions]}
+        groups = {}
+        for index, action in enumerate(actions):
+            args = action.get('amazon.aws.s3_object')
+            if not args or args.get('mode') != 'delobj':
+                continue
+            group = (str(args.get('bucket')),) + tuple((key, args.get(key)) for key in AWS_CONNECTION_KEYS)
+            groups.setdefault(group, []).append(index)
+
+        # Task which replaces a group, at the position of its first deletion
+        replaced = {}
+        removed = set()
+        for number, (group, indexes) in enumerate(groups.items()):
+            if len(indexes) < self.threshold:
+                continue
+
+            bucket, connection = group[0], dict(group[1:])
+            keys = [normalize_key(str(actions[index]['amazon.aws.s3_object']['object'])) for index in indexes]
+            manifest = f"{self.callback.playbook_name}.rollback.s3-{number}.json"
+            with open(os.path.join(self.callback.playbook_output_path, manifest), 'w') as f:
+                json.dump({'bucket': bucket, 'keys': keys}, f)
+
+            self.callback._debug(f"{len(keys)} objects of bucket {bucket} deleted by {manifest}")
+            replaced[indexes[0]] = {
+                'name': f"(UNDO) delete {len(keys)} objects from bucket {bucket}",
+                BULK_DELETE_MODULE: {
+                    'bucket': bucket,
+                    'keys_file': '{{ playbook_dir }}/' + manifest,
+                } | {key: value for key, value in connection.items() if value},
+            }
+            removed |= set(indexes)
+
+        result = []
+        for index, action in enumerate(actions):
+            if index in replaced:
+                result.append(replaced[index])
+            elif index not in removed:
+                result.append(action)
+
+        return result
+
+# EOF
@@ -37,8 +37,11 @@ class CleanerBase(ABC):
         pass
 
     # Convert AnsibleUnsafeText into a real str (needed for the YAML dumper)
+    # str.__str__ also works with a plain str (ansible-core >= 2.19 no longer wraps values)
     def _to_text(self, value):
-        return super(type(value), value).__str__()
+        if isinstance(value, str):
+            return str.__str__(value)
+        return str(value)
 
 
 # Decorator for unsupported module
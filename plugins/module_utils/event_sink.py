@@ -0,0 +1,202 @@
+# Streams the undo records to an external consumer
+
+import os
+import json
+import stat
+import time
+import queue
+import select
+import socket
+import struct
+import threading
+
+
+# Each message is prefixed by its length (4 bytes, network order)
+HEADER = struct.Struct('!I')
+
+# Delay between two connection attempts when the consumer is not listening
+RECONNECT_DELAY = 1.0
+
+# Time given to the writer thread to flush the queue at the end of the Playbook
+CLOSE_TIMEOUT = 2.0
+
+# A consumer stalled for longer loses the record being sent (and the connection)
+SEND_TIMEOUT = 30.0
+
+
+class EventSink:
+    '''
+    Sends undo records as length-prefixed JSON messages over a Unix domain
+    socket or a named pipe. The records are buffered in a bounded queue
+    and sent by a background thread, so the Playbook is never held up
+    by a slow (or missing) consumer. When the queue is full, the records
+    are appended to the spill file if one is given, or dropped otherwise.
+    '''
+    def __init__(self, callback, path, queue_size=1000, spill_path=None):
+        self.callback = callback
+        self.path = path
+        self.spill_path = spill_path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.spilled = 0
+        self._stream = None
+        self._in_flight = None          # record being written by the writer thread
+        self._lock = threading.Lock()   # counters and spill file are shared with the writer thread
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='resource_cleaner_sink', daemon=True)
+        self._thread.start()
+
+    # Called by the callback: never blocks
+    def send(self, record):
+        try:
+            payload = json.dumps(record, default=str).encode('utf-8')
+        except Exception as e:
+            self.callback._debug(f"Cannot serialize event: {e}")
+            return
+
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            self._overflow(payload)
+
+    # The consumer is too slow: spill the record to disk or drop it
+    def _overflow(self, payload):
+        with self._lock:
+            if self.spill_path:
+                try:
+                    # The records may hold credentials: the file is only readable by its owner
+                    fd = os.open(self.spill_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                    with os.fdopen(fd, 'ab') as f:
+                        f.write(payload + b'\n')
+                    self.spilled += 1
+                    return
+                except OSError as e:
+                    self.callback._debug(f"Cannot spill event to {self.spill_path}: {e}")
+
+            self.dropped += 1
+
+    # The record being written will not reach the consumer (counted only once)
+    def _drop_in_flight(self):
+        with self._lock:
+            if self._in_flight is not None:
+                self._in_flight = None
+                self.dropped += 1
+
+    # Flush what can be flushed in a limited time, then stop the writer thread
+    def close(self):
+        self._closing.set()
+        self._thread.join(CLOSE_TIMEOUT)
+        if self._thread.is_alive():
+            # The writer is still blocked on the consumer and keeps its stream (daemon thread)
+            self._drop_in_flight()
+        else:
+            self._disconnect()
+
+        # Whatever is left in the queue is lost for the consumer
+        while True:
+            try:
+                self._overflow(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if self.spilled:
+            self.callback._info(f"{self.spilled} event(s) spilled to {self.spill_path}")
+        if self.dropped:
+            self.callback._info(f"{self.dropped} event(s) dropped: the consumer on {self.path} is too slow or absent")
+
+    # Writer thread
+    def _run(self):
+        payload = None
+        while True:
+            if payload is None:
+                try:
+                    payload = self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    if self._closing.is_set():
+                        return
+                    continue
+
+            if self._stream is None and not self._connect():
+                if self._closing.is_set():
+                    # No consumer: give the record back so close() can spill it
+                    self._requeue(payload)
+                    return
+                self._closing.wait(RECONNECT_DELAY)
+                continue
+
+            self._in_flight = payload
+            try:
+                self._write(HEADER.pack(len(payload)) + payload)
+                with self._lock:
+                    self._in_flight = None
+                payload = None
+            except TimeoutError:
+                # Part of the frame may have been sent: do not send it again
+                self.callback._debug(f"Event consumer on {self.path} is stalled: record dropped")
+                self._drop_in_flight()
+                payload = None
+                self._disconnect()
+            except OSError as e:
+                self.callback._debug(f"Event consumer on {self.path} has gone away: {e}")
+                with self._lock:
+                    self._in_flight = None     # sent again after reconnecting
+                self._disconnect()
+
+    def _requeue(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            self._overflow(payload)
+
+    # Open the socket or the named pipe
+    def _connect(self):
+        try:
+            if stat.S_ISFIFO(os.stat(self.path).st_mode):
+                # Opening a FIFO without reader fails with ENXIO instead of blocking,
+                # and the writes stay non-blocking to apply SEND_TIMEOUT (see _write)
+                self._stream = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            else:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(CLOSE_TIMEOUT)
+                try:
+                    sock.connect(self.path)
+                except OSError:
+                    sock.close()
+                    raise
+                sock.settimeout(SEND_TIMEOUT)
+                self._stream = sock
+        except OSError:
+            self._stream = None
+            return False
+
+        self.callback._debug(f"Event consumer connected on {self.path}")
+        return True
+
+    def _write(self, data):
+        if isinstance(self._stream, socket.socket):
+            self._stream.sendall(data)
+            return
+
+        deadline = time.monotonic() + SEND_TIMEOUT
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self._stream, view):]
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([], [self._stream], [], remaining)[1]:
+                    raise TimeoutError(f"{self.path} is not read anymore")
+
+    def _disconnect(self):
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return
+        try:
+            if isinstance(stream, socket.socket):
+                stream.close()
+            else:
+                os.close(stream)
+        except OSError:
+            pass
+
+# EOF
@@ -0,0 +1,36 @@
+# Multi-object deletion of S3 keys (shared by the callback and the s3_bulk_delete module)
+
+# Maximum number of keys in a DeleteObjects call
+CHUNK_SIZE = 1000
+
+
+def normalize_key(key):
+    '''
+    Same normalization as amazon.aws.s3_object: the leading "/" is removed
+    '''
+    if key.startswith('/'):
+        return key[1:]
+    return key
+
+
+def delete_keys(client, bucket, keys):
+    '''
+    Deletes the keys by chunks of CHUNK_SIZE.
+    Returns the number of keys reported deleted by S3 and the list of errors.
+    '''
+    deleted = 0
+    errors = []
+    keys = [normalize_key(key) for key in keys]
+    for start in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[start:start + CHUNK_SIZE]
+        response = client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in chunk], 'Quiet': False},
+        )
+        deleted += len(response.get('Deleted', []))
+        errors += [{'key': error.get('Key'), 'code': error.get('Code'), 'message': error.get('Message')}
+                   for error in response.get('Errors', [])]
+
+    return deleted, errors
+
+# EOF
@@ -0,0 +1,105 @@
+# Record and replay of the task results handled by the callback
+
+import gzip
+import json
+import zlib
+
+from ansible.utils.display import Display
+from ansible.utils.unsafe_proxy import wrap_var
+
+display = Display()
+
+
+class TaskRecorder:
+    '''
+    Appends the relevant parts of the task results to a gzip-compressed
+    JSONL file, so the rollback Playbook can be regenerated offline
+    (see tools/rollback_replay.py). The file is rewritten by each run, and
+    flushed after each record so it remains readable if the run is killed.
+    '''
+    def __init__(self, callback, path):
+        self.callback = callback
+        self.path = path
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+
+    # The options change the post-processing of the actions: they are replayed too
+    def record_playbook(self, playbook_name, options=None):
+        self._write({
+            'event': 'playbook',
+            'name': playbook_name,
+            'options': options or {},
+        })
+
+    def record_play(self, play):
+        self._write({
+            'event': 'play',
+            'name': str(play.name),
+            'hosts': str(play.hosts[0]) if play.hosts else None,
+            'connection': str(play.connection),
+            'gather_facts': play.gather_facts,
+        })
+
+    def record_result(self, result):
+        self._write({
+            'event': 'result',
+            'task_fields': {
+                'name': result._task_fields.get('name'),
+                'action': result._task_fields.get('action'),
+            },
+            'loop': bool(result._task.loop),
+            'result': result._result,
+        })
+
+    def close(self):
+        self.file.close()
+
+    def _write(self, record):
+        try:
+            self.file.write(json.dumps(record, default=str) + '\n')
+            self.file.flush()
+        except Exception as e:
+            self.callback._debug(f"Cannot record event into {self.path}: {e}")
+
+
+def load_records(path):
+    '''
+    Generator over the records of a file written by TaskRecorder.
+    The records of an interrupted run are read up to the last complete one.
+    '''
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, zlib.error) as e:
+            display.warning(f"{path} is truncated (interrupted run ?), only its complete records are used: {e}")
+
+
+class ReplayTask:
+    def __init__(self, loop):
+        self.loop = loop
+
+
+class ReplayPlay:
+    def __init__(self, record):
+        self.name = record.get('name')
+        self.hosts = [record.get('hosts')]
+        self.connection = record.get('connection')
+        self.gather_facts = record.get('gather_facts')
+
+
+class ReplayResult:
+    '''
+    Stands for the Ansible TaskResult: only exposes what the cleaners use.
+    Strings are marked unsafe again, as they are in a live run.
+    '''
+    def __init__(self, record):
+        self._task_fields = wrap_var(record['task_fields'])
+        self._task = ReplayTask(record.get('loop', False))
+        self._result = wrap_var(record['result'])
+        self.task_name = self._task_fields.get('name')
+
+    def is_changed(self):
+        return self._result.get('changed', False)
+
+# EOF
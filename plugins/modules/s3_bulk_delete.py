@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# GNU General Public License v2.0+ (see https://www.gnu.org/licenses/old-licenses/gpl-2.0.txt)
+
+__metaclass__ = type
+
+DOCUMENTATION = '''
+module: s3_bulk_delete
+author: J.Delamarche
+short_description: Deletes many objects of an S3 bucket with multi-object deletes
+description:
+    - Deletes the keys listed in a manifest file, by chunks of 1000 keys per DeleteObjects call.
+    - Like amazon.aws.s3_object, a leading "/" is removed from the keys.
+    - Used by the rollback playbooks generated by the resource_cleaner callback
+      instead of one amazon.aws.s3_object task per key.
+options:
+  bucket:
+    description: name of the bucket
+    required: True
+    type: str
+  keys_file:
+    description: JSON file holding the list of the keys to delete (under the "keys" key)
+    required: True
+    type: path
+extends_documentation_fragment:
+  - amazon.aws.common.modules
+  - amazon.aws.region.modules
+  - amazon.aws.boto3
+'''
+
+EXAMPLES = '''
+- name: Delete the objects uploaded by the playbook
+  majeinfo.resource_cleaner.s3_bulk_delete:
+    bucket: my-bucket
+    keys_file: "{{ playbook_dir }}/site.yml.rollback.s3-0.json"
+    region: eu-west-3
+'''
+
+RETURN = '''
+deleted:
+  description: number of keys reported deleted by S3 (S3 also reports the keys which did not exist)
+  returned: always
+  type: int
+errors:
+  description: keys that could not be deleted, with the S3 error
+  returned: always
+  type: list
+'''
+
+import json
+
+try:
+    import botocore
+except ImportError:
+    pass  # handled by AnsibleAWSModule
+
+from ansible_collections.amazon.aws.plugins.module_utils.modules import AnsibleAWSModule
+from ansible_collections.majeinfo.resource_cleaner.plugins.module_utils.s3_delete import delete_keys
+
+
+def main():
+    module = AnsibleAWSModule(
+        argument_spec=dict(
+            bucket=dict(type='str', required=True),
+            keys_file=dict(type='path', required=True),
+        ),
+        supports_check_mode=True,
+    )
+
+    bucket = module.params['bucket']
+    try:
+        with open(module.params['keys_file']) as f:
+            keys = json.load(f)['keys']
+    except (OSError, ValueError, KeyError) as e:
+        module.fail_json(msg=f"Cannot read the keys file {module.params['keys_file']}: {e}")
+
+    if module.check_mode:
+        module.exit_json(changed=bool(keys), deleted=len(keys), errors=[])
+
+    client = module.client('s3')
+    try:
+        deleted, errors = delete_keys(client, bucket, keys)
+    except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+        module.fail_json_aws(e, msg=f"Failed to delete objects from bucket {bucket}")
+
+    if errors:
+        module.fail_json(msg=f"{len(errors)} object(s) could not be deleted from bucket {bucket}",
+                         changed=deleted > 0, deleted=deleted, errors=errors)
+
+    module.exit_json(changed=deleted > 0, deleted=deleted, errors=errors)
+
+
+if __name__ == '__main__':
+    main()
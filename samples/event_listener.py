@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+'''
+Minimal consumer for the resource_cleaner event stream:
+listens on a Unix domain socket and prints each undo record.
+
+usage: event_listener.py /tmp/resource_cleaner.sock
+'''
+
+import os
+import sys
+import json
+import socket
+import struct
+
+HEADER = struct.Struct('!I')
+
+
+def read_exactly(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def main(path):
+    if os.path.exists(path):
+        os.unlink(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    while True:
+        conn, _ = server.accept()
+        with conn:
+            while (header := read_exactly(conn, HEADER.size)) is not None:
+                payload = read_exactly(conn, HEADER.unpack(header)[0])
+                if payload is None:
+                    break
+                print(json.dumps(json.loads(payload)), flush=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit(f"usage: {sys.argv[0]} socket_path")
+    main(sys.argv[1])
+
+# EOF
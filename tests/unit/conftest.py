@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../..')
+)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+
+class FakeCallback:
+    '''
+    Stands for the CallbackModule: keeps the messages displayed with _info
+    '''
+    playbook_name = 'site.yml'
+
+    def __init__(self, output_path):
+        self.playbook_output_path = output_path
+        self.messages = []
+
+    def _debug(self, msg):
+        pass
+
+    def _info(self, msg):
+        self.messages.append(msg)
+
+
+@pytest.fixture
+def callback(tmp_path):
+    return FakeCallback(str(tmp_path))
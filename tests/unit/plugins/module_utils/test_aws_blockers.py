@@ -0,0 +1,124 @@
+import pytest
+
+moto = pytest.importorskip('moto')
+boto3 = pytest.importorskip('boto3')
+
+from plugins.module_utils.aws_blockers import AWSBlockerDiscovery
+
+REGION = 'eu-west-3'
+
+
+@pytest.fixture
+def ec2(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with moto.mock_aws():
+        yield boto3.client('ec2', region_name=REGION)
+
+
+def undo(module, **args):
+    return {'name': f'(UNDO) {module}', module: {'state': 'absent', 'region': REGION} | args}
+
+
+def task_index(actions, predicate):
+    return next(index for index, action in enumerate(actions) if predicate(action))
+
+
+def test_blockers_are_handled_before_their_parents(ec2, callback):
+    vpc_id = ec2.create_vpc(CidrBlock='10.1.0.0/16')['Vpc']['VpcId']
+    nat_subnet_id = ec2.create_subnet(VpcId=vpc_id, CidrBlock='10.1.1.0/24')['Subnet']['SubnetId']
+    eni_subnet_id = ec2.create_subnet(VpcId=vpc_id, CidrBlock='10.1.2.0/24')['Subnet']['SubnetId']
+    group_id = ec2.create_security_group(GroupName='g', Description='d', VpcId=vpc_id)['GroupId']
+    eni_id = ec2.create_network_interface(SubnetId=eni_subnet_id, Groups=[group_id])['NetworkInterface']['NetworkInterfaceId']
+    allocation_id = ec2.allocate_address(Domain='vpc')['AllocationId']
+    nat_id = ec2.create_nat_gateway(SubnetId=nat_subnet_id, AllocationId=allocation_id)['NatGateway']['NatGatewayId']
+
+    actions = [
+        undo('amazon.aws.ec2_security_group', group_id=group_id),
+        undo('amazon.aws.ec2_vpc_subnet', vpc_id=vpc_id, cidr='10.1.1.0/24'),
+        undo('amazon.aws.ec2_vpc_subnet', vpc_id=vpc_id, cidr='10.1.2.0/24'),
+        undo('amazon.aws.ec2_vpc_net', vpc_id=vpc_id),
+    ]
+    result = AWSBlockerDiscovery(callback).insert_blockers(actions)
+
+    # The original actions are kept, in the same order
+    assert [action for action in result if action in actions] == actions
+
+    def index_of_module(module, key, value):
+        return task_index(result, lambda action: action.get(module, {}).get(key) == value)
+
+    def index_of_wait(filter_name, value):
+        return task_index(result, lambda action: action.get('amazon.aws.ec2_eni_info', {})
+                          .get('filters', {}).get(filter_name) == value)
+
+    group_index = index_of_module('amazon.aws.ec2_security_group', 'group_id', group_id)
+    nat_subnet_index = index_of_module('amazon.aws.ec2_vpc_subnet', 'cidr', '10.1.1.0/24')
+    eni_subnet_index = index_of_module('amazon.aws.ec2_vpc_subnet', 'cidr', '10.1.2.0/24')
+    vpc_index = index_of_module('amazon.aws.ec2_vpc_net', 'vpc_id', vpc_id)
+
+    # The free ENI is deleted before the first parent it blocks (the security group)
+    assert index_of_module('amazon.aws.ec2_eni', 'eni_id', eni_id) < group_index
+    # The NAT gateway is deleted before its subnet
+    nat_index = index_of_module('amazon.aws.ec2_vpc_nat_gateway', 'nat_gateway_id', nat_id)
+    assert group_index < nat_index < nat_subnet_index
+
+    # Each parent deletion is preceded by a wait filtered on the parent itself
+    assert index_of_wait('group-id', group_id) == group_index - 1
+    assert index_of_wait('subnet-id', nat_subnet_id) == nat_subnet_index - 1
+    assert index_of_wait('subnet-id', eni_subnet_id) == eni_subnet_index - 1
+    assert index_of_wait('vpc-id', vpc_id) == vpc_index - 1
+
+
+def test_blockers_already_in_the_rollback_are_not_duplicated(ec2, callback):
+    vpc_id = ec2.create_vpc(CidrBlock='10.1.0.0/16')['Vpc']['VpcId']
+    subnet_id = ec2.create_subnet(VpcId=vpc_id, CidrBlock='10.1.1.0/24')['Subnet']['SubnetId']
+    eni_id = ec2.create_network_interface(SubnetId=subnet_id)['NetworkInterface']['NetworkInterfaceId']
+
+    actions = [
+        undo('amazon.aws.ec2_eni', eni_id=eni_id),
+        undo('amazon.aws.ec2_vpc_net', vpc_id=vpc_id),
+    ]
+    result = AWSBlockerDiscovery(callback).insert_blockers(actions)
+
+    assert sum('amazon.aws.ec2_eni' in action for action in result) == 1
+
+
+def test_load_balancer_modules(ec2, callback):
+    vpc_id = ec2.create_vpc(CidrBlock='10.1.0.0/16')['Vpc']['VpcId']
+    subnets = [ec2.create_subnet(VpcId=vpc_id, CidrBlock=f'10.1.{i}.0/24', AvailabilityZone=f'{REGION}{zone}')
+               ['Subnet']['SubnetId'] for i, zone in enumerate('ab')]
+    elbv2 = boto3.client('elbv2', region_name=REGION)
+    elbv2.create_load_balancer(Name='alb', Subnets=subnets, Type='application')
+    elbv2.create_load_balancer(Name='nlb', Subnets=subnets, Type='network')
+
+    session = boto3.session.Session(region_name=REGION)
+    load_balancers = AWSBlockerDiscovery(callback)._load_balancers(session, {vpc_id})
+
+    assert sorted((lb['Name'], module) for module, lb in load_balancers) == [
+        ('alb', 'amazon.aws.elb_application_lb'),
+        ('nlb', 'community.aws.elb_network_lb'),
+    ]
+
+
+def test_blockers_of_an_existing_vpc_are_not_deleted(ec2, callback):
+    # Existing VPC, with a production load balancer, a NAT gateway and an ENI
+    vpc_id = ec2.create_vpc(CidrBlock='10.1.0.0/16')['Vpc']['VpcId']
+    subnets = [ec2.create_subnet(VpcId=vpc_id, CidrBlock=f'10.1.{i}.0/24', AvailabilityZone=f'{REGION}{zone}')
+               ['Subnet']['SubnetId'] for i, zone in enumerate('ab')]
+    allocation_id = ec2.allocate_address(Domain='vpc')['AllocationId']
+    ec2.create_nat_gateway(SubnetId=subnets[0], AllocationId=allocation_id)
+
+    # The playbook only created a security group, used by the load balancer and the ENI
+    group_id = ec2.create_security_group(GroupName='g', Description='d', VpcId=vpc_id)['GroupId']
+    ec2.create_network_interface(SubnetId=subnets[1], Groups=[group_id])
+    elbv2 = boto3.client('elbv2', region_name=REGION)
+    elbv2.create_load_balancer(Name='prod-alb', Subnets=subnets, SecurityGroups=[group_id], Type='application')
+    # moto does not create the ENIs of the load balancers
+    ec2.create_network_interface(SubnetId=subnets[0], Groups=[group_id], Description='ELB app/prod-alb/0123456789')
+
+    actions = [undo('amazon.aws.ec2_security_group', group_id=group_id)]
+    result = AWSBlockerDiscovery(callback).insert_blockers(actions)
+
+    # Only the wait for the release of the ENIs is added
+    assert [list(action)[1] for action in result] == ['amazon.aws.ec2_eni_info', 'amazon.aws.ec2_security_group']
+    assert any('prod-alb' in message for message in callback.messages)
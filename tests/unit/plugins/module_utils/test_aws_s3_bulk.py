@@ -0,0 +1,73 @@
+import os
+import json
+
+import pytest
+
+moto = pytest.importorskip('moto')
+boto3 = pytest.importorskip('boto3')
+
+from plugins.module_utils.aws_s3_bulk import AWSS3BulkDelete, BULK_DELETE_MODULE
+from plugins.module_utils.s3_delete import delete_keys
+
+REGION = 'eu-west-3'
+BUCKET = 'rollback-bulk-test'
+
+
+def delobj(key, bucket=BUCKET):
+    return {
+        'name': f'(UNDO) put {key}',
+        'amazon.aws.s3_object': {'mode': 'delobj', 'object': key, 'bucket': bucket, 'region': REGION},
+    }
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name=REGION)
+        client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': REGION})
+        yield client
+
+
+def test_coalesce_and_bulk_delete(s3, callback, tmp_path):
+    # Half of the keys were given with a leading "/", which s3_object removes
+    keys = [f'/dir/key-{i}.txt' if i % 2 else f'dir/key-{i}.txt' for i in range(2500)]
+    for key in keys:
+        s3.put_object(Bucket=BUCKET, Key=key.lstrip('/'), Body=b'x')
+    s3.put_object(Bucket=BUCKET, Key='kept.txt', Body=b'x')
+
+    actions = [delobj(key) for key in keys]
+    actions.insert(10, delobj('other.txt', bucket='another-bucket'))
+    actions.append({'name': '(UNDO) bucket', 'amazon.aws.s3_bucket': {'state': 'absent', 'name': BUCKET}})
+    result = AWSS3BulkDelete(callback, threshold=100).coalesce(actions)
+
+    # One bulk task in place of the first deletion, the other tasks are kept in order
+    assert [list(action)[1] for action in result] == \
+        [BULK_DELETE_MODULE, 'amazon.aws.s3_object', 'amazon.aws.s3_bucket']
+    bulk = result[0][BULK_DELETE_MODULE]
+    assert bulk['bucket'] == BUCKET and bulk['region'] == REGION
+
+    manifest = os.path.join(str(tmp_path), os.path.basename(bulk['keys_file']))
+    with open(manifest) as f:
+        manifest_keys = json.load(f)['keys']
+    assert len(manifest_keys) == 2500
+    assert not any(key.startswith('/') for key in manifest_keys)
+
+    deleted, errors = delete_keys(s3, BUCKET, manifest_keys)
+    assert (deleted, errors) == (2500, [])
+    assert [obj['Key'] for obj in s3.list_objects_v2(Bucket=BUCKET)['Contents']] == ['kept.txt']
+
+
+def test_below_threshold_is_unchanged(callback, tmp_path):
+    actions = [delobj(f'key-{i}') for i in range(5)]
+    assert AWSS3BulkDelete(callback, threshold=100).coalesce(actions) == actions
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_delete_keys_normalizes_keys(s3):
+    s3.put_object(Bucket=BUCKET, Key='dir/a.txt', Body=b'x')
+
+    deleted, errors = delete_keys(s3, BUCKET, ['/dir/a.txt'])
+    assert (deleted, errors) == (1, [])
+    assert 'Contents' not in s3.list_objects_v2(Bucket=BUCKET)
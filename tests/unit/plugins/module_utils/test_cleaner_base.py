@@ -0,0 +1,11 @@
+from ansible.utils.unsafe_proxy import AnsibleUnsafeText
+
+from plugins.module_utils.aws_cleaner import AWSCleaner
+
+
+def test_to_text_returns_plain_str(callback):
+    cleaner = AWSCleaner(callback)
+    for value in ('vpc-1', AnsibleUnsafeText('vpc-1')):
+        text = cleaner._to_text(value)
+        assert text == 'vpc-1'
+        assert type(text) is str
@@ -0,0 +1,152 @@
+import os
+import json
+import stat
+import socket
+import threading
+
+import pytest
+
+from plugins.module_utils import event_sink
+from plugins.module_utils.event_sink import EventSink, HEADER
+
+
+# Local consumer: returns the received frames once the sink closes the connection
+class Listener:
+    def __init__(self, path, read=True):
+        self.frames = []
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+        self.read = read
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        conn, _ = self.server.accept()
+        if not self.read:
+            # Stalled consumer: keep the connection open without reading
+            self.ready.wait()
+            conn.close()
+            return
+        data = b''
+        while chunk := conn.recv(65536):
+            data += chunk
+        conn.close()
+        while data:
+            size = HEADER.unpack(data[:HEADER.size])[0]
+            self.frames.append(json.loads(data[HEADER.size:HEADER.size + size]))
+            data = data[HEADER.size + size:]
+
+    def join(self):
+        self.thread.join(5)
+        self.server.close()
+
+
+@pytest.fixture
+def socket_path():
+    # AF_UNIX paths are limited to ~100 characters
+    path = os.path.join('/tmp', f'sink-{os.getpid()}-{threading.get_ident()}.sock')
+    yield path
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def test_frames_are_length_prefixed_json(callback, socket_path):
+    listener = Listener(socket_path)
+    sink = EventSink(callback, socket_path, queue_size=100)
+    records = [{'module': 'amazon.aws.ec2_vpc_net', 'action': {'vpc_id': f'vpc-{i}'}} for i in range(50)]
+    for record in records:
+        sink.send(record)
+    sink.close()
+    listener.join()
+
+    assert listener.frames == records
+    assert sink.dropped == 0 and sink.spilled == 0
+
+
+def test_spill_when_no_consumer(callback, tmp_path):
+    spill_path = tmp_path / 'events.jsonl'
+    sink = EventSink(callback, str(tmp_path / 'absent.sock'), queue_size=2, spill_path=str(spill_path))
+    for i in range(10):
+        sink.send({'i': i})
+    sink.close()
+
+    lines = [json.loads(line) for line in spill_path.read_text().splitlines()]
+    assert sorted(line['i'] for line in lines) == list(range(10))
+    assert sink.spilled == 10 and sink.dropped == 0
+    assert stat.S_IMODE(os.stat(spill_path).st_mode) == 0o600
+
+
+def test_drop_when_no_consumer_and_no_spill(callback, tmp_path):
+    sink = EventSink(callback, str(tmp_path / 'absent.sock'), queue_size=2)
+    for i in range(10):
+        sink.send({'i': i})
+    sink.close()
+
+    assert sink.dropped == 10
+
+
+def test_stalled_consumer_drops_the_record(callback, socket_path, monkeypatch):
+    monkeypatch.setattr(event_sink, 'SEND_TIMEOUT', 0.2)
+    listener = Listener(socket_path, read=False)
+    sink = EventSink(callback, socket_path, queue_size=10)
+    # Larger than the socket buffers: the send times out
+    sink.send({'data': 'x' * (16 * 2 ** 20)})
+    sink.close()
+    listener.ready.set()
+    listener.join()
+
+    assert sink.dropped == 1
+    assert sink.queue.empty()
+
+
+@pytest.fixture
+def fifo_path(tmp_path):
+    path = str(tmp_path / 'events.fifo')
+    os.mkfifo(path)
+    # Reader which never reads unless told to (opened first: the sink does not wait for it)
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    yield path, fd
+    os.close(fd)
+
+
+def test_fifo_frames(callback, fifo_path):
+    path, fd = fifo_path
+    sink = EventSink(callback, path, queue_size=100)
+    records = [{'i': i} for i in range(50)]
+    for record in records:
+        sink.send(record)
+    sink.close()
+
+    data = os.read(fd, 2 ** 20)
+    frames = []
+    while data:
+        size = HEADER.unpack(data[:HEADER.size])[0]
+        frames.append(json.loads(data[HEADER.size:HEADER.size + size]))
+        data = data[HEADER.size + size:]
+    assert frames == records
+
+
+def test_stalled_fifo_drops_the_record(callback, fifo_path, monkeypatch):
+    monkeypatch.setattr(event_sink, 'SEND_TIMEOUT', 0.2)
+    sink = EventSink(callback, fifo_path[0], queue_size=10)
+    # Larger than the pipe buffer: the write times out
+    sink.send({'data': 'x' * (2 ** 20)})
+    sink.close()
+    sink._thread.join(5)
+
+    assert sink.dropped == 1
+    assert not sink._thread.is_alive()
+
+
+def test_close_counts_the_record_of_a_blocked_writer(callback, fifo_path, monkeypatch):
+    monkeypatch.setattr(event_sink, 'CLOSE_TIMEOUT', 0.2)
+    sink = EventSink(callback, fifo_path[0], queue_size=10)
+    sink.send({'data': 'x' * (2 ** 20)})
+    sink.close()
+
+    # The writer is still waiting for the reader: the record is reported lost, once
+    assert sink._thread.is_alive()
+    assert sink.dropped == 1
+    assert any('1 event(s) dropped' in message for message in callback.messages)
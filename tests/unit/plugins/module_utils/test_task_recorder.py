@@ -0,0 +1,36 @@
+from plugins.module_utils.task_recorder import TaskRecorder, load_records
+
+
+def test_records_readable_without_close(callback, tmp_path):
+    path = str(tmp_path / 'run.jsonl.gz')
+    recorder = TaskRecorder(callback, path)
+    for i in range(3000):
+        recorder.record_playbook(f'pb-{i}.yml')
+
+    # The run is killed: the gzip stream is never closed
+    records = list(load_records(path))
+    assert len(records) == 3000
+    assert records[-1] == {'event': 'playbook', 'name': 'pb-2999.yml', 'options': {}}
+
+
+def test_truncated_file_keeps_complete_records(callback, tmp_path):
+    path = tmp_path / 'run.jsonl.gz'
+    recorder = TaskRecorder(callback, str(path))
+    for i in range(100):
+        recorder.record_playbook(f'pb-{i}.yml')
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) - 3])
+
+    records = list(load_records(str(path)))
+    assert 0 < len(records) <= 100
+    assert records[0] == {'event': 'playbook', 'name': 'pb-0.yml', 'options': {}}
+
+
+def test_each_run_rewrites_the_file(callback, tmp_path):
+    path = str(tmp_path / 'run.jsonl.gz')
+    for name in ('first.yml', 'second.yml'):
+        recorder = TaskRecorder(callback, path)
+        recorder.record_playbook(name)
+        recorder.close()
+
+    assert list(load_records(path)) == [{'event': 'playbook', 'name': 'second.yml', 'options': {}}]
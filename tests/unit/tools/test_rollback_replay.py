@@ -0,0 +1,73 @@
+import os
+
+from ansible.executor.stats import AggregateStats
+
+from benchmarks.synthetic_results import synthetic_results
+from plugins.callback.resource_cleaner import CallbackModule
+from plugins.module_utils.task_recorder import TaskRecorder
+from tools.rollback_replay import replay
+
+
+class Playbook:
+    _file_name = '/playbooks/site.yml'
+
+
+class Play:
+    name = 'site'
+    hosts = ['localhost']
+    connection = 'local'
+    gather_facts = False
+
+
+def live_run(output_path, record_path):
+    callback = CallbackModule()
+    callback.playbook_output_path = output_path
+    callback.recorder = TaskRecorder(callback, record_path)
+    # Three deletions from the same bucket: coalesced into an s3_bulk_delete task
+    callback.s3_bulk_delete_threshold = 3
+    callback.v2_playbook_on_start(Playbook())
+    callback.v2_playbook_on_play_start(Play())
+    for result in synthetic_results(200):
+        if result._task.loop:
+            callback.v2_runner_item_on_ok(result)
+        else:
+            callback.v2_runner_on_ok(result)
+    callback.v2_playbook_on_stats(AggregateStats())
+
+
+def read_outputs(path):
+    outputs = {}
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), 'rb') as f:
+            outputs[name] = f.read()
+    return outputs
+
+
+def test_replay_rebuilds_the_live_rollback(tmp_path):
+    live_path, replay_path = tmp_path / 'live', tmp_path / 'replay'
+    live_path.mkdir()
+    replay_path.mkdir()
+    record_path = str(tmp_path / 'run.jsonl.gz')
+    live_run(str(live_path), record_path)
+
+    rollback = replay(record_path, str(replay_path))
+
+    assert rollback == os.path.join(str(replay_path), 'site.yml.rollback')
+    live = read_outputs(str(live_path))
+    assert sorted(live) == ['site.yml.rollback', 'site.yml.rollback.s3-0.json']
+    assert b'majeinfo.resource_cleaner.s3_bulk_delete' in live['site.yml.rollback']
+    assert read_outputs(str(replay_path)) == live
+
+
+def test_options_override_the_recorded_run(tmp_path):
+    live_path, replay_path = tmp_path / 'live', tmp_path / 'replay'
+    live_path.mkdir()
+    replay_path.mkdir()
+    record_path = str(tmp_path / 'run.jsonl.gz')
+    live_run(str(live_path), record_path)
+
+    replay(record_path, str(replay_path), options={'s3_bulk_delete_threshold': 0, 'discover_blockers': None})
+
+    assert os.listdir(str(replay_path)) == ['site.yml.rollback']
+    with open(os.path.join(str(replay_path), 'site.yml.rollback')) as f:
+        assert f.read().count('amazon.aws.s3_object:') > 3
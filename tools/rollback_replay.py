@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+'''
+Regenerates a rollback playbook offline from a file recorded by the
+resource_cleaner callback (record_path parameter), without running
+the original playbook again. The rollback is post-processed with the
+discover_blockers and s3_bulk_delete_threshold options of the recorded
+run, unless they are given on the command line.
+
+usage: rollback_replay.py [-o output_dir] [-v] [--[no-]discover-blockers]
+                          [--s3-bulk-delete-threshold N] record.jsonl.gz
+'''
+
+import os
+import sys
+import argparse
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')
+)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from plugins.callback.resource_cleaner import CallbackModule
+from plugins.module_utils.task_recorder import load_records, ReplayPlay, ReplayResult
+
+
+def replay(record_path, output_path, verbosity=0, options=None):
+    '''
+    Feeds the recorded results to the callback and writes the rollback playbook.
+    The given options override the ones of the recorded run.
+    Returns the path of the generated file, or None if there is nothing to rollback.
+    '''
+    options = {name: value for name, value in (options or {}).items() if value is not None}
+    callback = CallbackModule()
+    callback._display.verbosity = verbosity
+    callback.playbook_output_path = output_path
+    callback.playbook_name = os.path.basename(record_path)
+
+    for record in load_records(record_path):
+        event = record.get('event')
+        if event == 'playbook':
+            callback.playbook_name = record['name']
+            for name, value in (record.get('options', {}) | options).items():
+                setattr(callback, name, value)
+        elif event == 'play':
+            # Like a live run, only the last Play is kept
+            callback.play = ReplayPlay(record)
+            callback.actions = []
+        elif event == 'result':
+            callback._handle_action(ReplayResult(record))
+
+    if not callback.actions:
+        return None
+
+    # Same post-processing as at the end of the recorded run
+    callback.generate_rollback()
+    return os.path.join(output_path, callback.playbook_name + '.rollback')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regenerate a rollback playbook from recorded task results')
+    parser.add_argument('record_path', help='file written by the callback (record_path parameter)')
+    parser.add_argument('-o', '--output', default='.', help='directory where the rollback playbook is written')
+    parser.add_argument('-v', '--verbose', action='count', default=0)
+    parser.add_argument('--discover-blockers', action=argparse.BooleanOptionalAction,
+                        help='discover the blocking resources (default: as in the recorded run)')
+    parser.add_argument('--s3-bulk-delete-threshold', type=int, metavar='N',
+                        help='coalesce the S3 object deletions (default: as in the recorded run, 0 to disable)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.output):
+        sys.exit(f"{args.output} is not a directory")
+
+    options = {
+        'discover_blockers': args.discover_blockers,
+        's3_bulk_delete_threshold': args.s3_bulk_delete_threshold,
+    }
+    if (rollback := replay(args.record_path, args.output, args.verbose, options)) is None:
+        print("Nothing to rollback")
+    else:
+        print(f"Rollback playbook written to {rollback}")
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF